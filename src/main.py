@@ -1,18 +1,62 @@
 import os
 import sys
+import atexit
+import queue
 import shutil
+import logging
+import logging.handlers
+import orjson
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory, redirect, url_for
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from sqlalchemy import event
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.vendor import vendor_bp
 from src.routes.admin import admin_bp
 
+# INFO by default; LOG_LEVEL=DEBUG brings back the detailed per-invoice output
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+# Request threads only enqueue log records; a listener thread does the writes
+_root_logger = logging.getLogger()
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, *_root_logger.handlers, respect_handler_level=True)
+_root_logger.handlers = [logging.handlers.QueueHandler(_log_queue)]
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+class OrJSONProvider(DefaultJSONProvider):
+    """jsonify/request.get_json backed by orjson. Dates keep Flask's HTTP-date
+    format (they are passed through to the default provider's default hook), and
+    anything orjson refuses, such as ints beyond 64 bits, is serialized by the
+    default provider instead"""
+    
+    def _options(self, indent=False):
+        # Naive datetimes are passed through as well, so every date goes to self.default
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+app.json = OrJSONProvider(app)
 
 # Enable CORS for all routes
 CORS(app)
@@ -69,9 +113,25 @@ else:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    # WAL lets readers run during a commit; NORMAL syncs at checkpoints instead of on every commit
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
 with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', _sqlite_pragmas)
+    
     db.create_all()
     
+    # create_all skips tables that already exist, so add any missing invoice indexes to older databases
+    from src.models.vendor import Invoice
+    for ix in Invoice.__table__.indexes:
+        ix.create(db.engine, checkfirst=True)
+    
     # Initialize default config if not exists
     from src.models.vendor import FinBotConfig
     if not FinBotConfig.query.first():
@@ -11,7 +11,7 @@ class Vendor(db.Model):
     contact_email = db.Column(db.String(120), nullable=False, unique=True)
     phone_number = db.Column(db.String(20), nullable=False)
     business_type = db.Column(db.String(50), nullable=False)
-    vendor_category = db.Column(db.Text, nullable=False)  # JSON string of categories
+    vendor_category = db.Column(db.JSON, nullable=False, default=list)  # list of categories; existing TEXT rows already hold JSON
     tax_id = db.Column(db.String(50), nullable=False)
     bank_name = db.Column(db.String(100), nullable=False)
     account_holder_name = db.Column(db.String(100), nullable=False)
@@ -47,15 +47,18 @@ class Vendor(db.Model):
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        db.Index('ix_invoice_vendor_created', 'vendor_id', 'created_at'),  # vendor invoice list, newest first
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'), nullable=False)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'), nullable=False, index=True)
     invoice_number = db.Column(db.String(50), nullable=False, unique=True)
     amount = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text, nullable=False)
     invoice_date = db.Column(db.Date, nullable=False)
     due_date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(20), default='submitted')  # submitted, processing, approved, rejected, paid
+    status = db.Column(db.String(20), default='submitted', index=True)  # submitted, processing, approved, rejected, paid
     ai_decision = db.Column(db.String(20))  # auto_approve, flag_review, reject
     ai_confidence = db.Column(db.Float)  # 0.0 to 1.0
     ai_reasoning = db.Column(db.Text)
@@ -63,7 +66,7 @@ class Invoice(db.Model):
     human_decision = db.Column(db.String(20))  # approve, reject
     human_notes = db.Column(db.Text)
     payment_processed = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     processed_at = db.Column(db.DateTime)
     
     # CTF related fields
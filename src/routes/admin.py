@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, render_template
 from src.models.vendor import db, Vendor, Invoice, FinBotConfig
 from src.services.finbot_agent import FinBotAgent
-from src.services.multi_agent_finbot import MultiAgentFinBot
+from src.services.multi_agent_finbot import get_finbot
+from src.services import vendor_cache
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
@@ -100,6 +101,7 @@ def update_finbot_config():
         
         config.updated_at = datetime.utcnow()
         db.session.commit()
+        get_finbot().invalidate_config()
         
         return jsonify({
             "success": True,
@@ -127,6 +129,7 @@ def update_finbot_goals():
         config.custom_goals = data['goals']
         config.updated_at = datetime.utcnow()
         db.session.commit()
+        get_finbot().invalidate_config()
         
         return jsonify({
             "success": True,
@@ -154,7 +157,7 @@ def reprocess_invoice(invoice_id):
         db.session.commit()
         
         # Use multi-agent system
-        multi_agent_finbot = MultiAgentFinBot()
+        multi_agent_finbot = get_finbot()
         result = multi_agent_finbot.process_invoice(invoice_id)
         
         return jsonify({
@@ -236,6 +239,7 @@ def update_vendor_trust(vendor_id):
         
         vendor.trust_level = trust_level
         db.session.commit()
+        vendor_cache.invalidate_vendor(vendor_id)
         
         return jsonify({
             "success": True,
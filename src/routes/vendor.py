@@ -1,12 +1,186 @@
-from flask import Blueprint, request, jsonify
-import json
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+import copy
+import hashlib
+import logging
 import openai
+import orjson
+import os
+import threading
+import time
+from collections import OrderedDict
 from src.models.vendor import db, Vendor, Invoice
 # Import the new multi-agent system
-from src.services.multi_agent_finbot import MultiAgentFinBot
-from datetime import datetime
+from src.services.multi_agent_finbot import get_finbot
+from src.services.invoice_queue import enqueue_invoice
+from src.services import vendor_cache
+from datetime import datetime, date
 
 vendor_bp = Blueprint('vendor', __name__)
+logger = logging.getLogger(__name__)
+
+# Pipeline results keyed by invoice content: a repeat submission skips the agent chain.
+# Entries expire so that a result produced by the fallbacks (e.g. during an
+# LLM outage) is not replayed indefinitely
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL_S = float(os.getenv('FINBOT_RESULT_CACHE_TTL', '300'))
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+INVOICE_FIELDS = ('invoice_number', 'amount', 'description', 'invoice_date', 'due_date')
+
+
+def _fast_date(s):
+    """Parses YYYY-MM-DD by slicing; anything else goes through strptime"""
+    if len(s) == 10 and s[4] == '-' and s[7] == '-' and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit():
+        return date(int(s[:4]), int(s[5:7]), int(s[8:]))
+    return datetime.strptime(s, '%Y-%m-%d').date()
+
+
+def _precheck(data):
+    """Structural checks run before anything is written.
+
+    Only malformed payloads are stopped here; semantic problems (negative
+    amounts, vague descriptions) are left to the ValidatorAgent so that the
+    cascade can still be observed."""
+    errs = [f"missing field: {field}" for field in INVOICE_FIELDS if data.get(field) in (None, '')]
+    if errs:
+        return errs
+    try:
+        float(data['amount'])
+    except (TypeError, ValueError):
+        errs.append("amount is not a number")
+    for field in ('invoice_date', 'due_date'):
+        try:
+            _fast_date(data[field])
+        except (TypeError, ValueError):
+            errs.append(f"{field} is not a YYYY-MM-DD date")
+    return errs
+
+
+def _reasoning_of(invoice):
+    """Parsed ai_reasoning, kept on the instance until the stored text changes"""
+    raw = invoice.ai_reasoning
+    cached = getattr(invoice, '_cached_reasoning', None)
+    if cached is not None and cached[0] is raw:
+        return cached[1]
+    data = orjson.loads(raw) if raw else {}
+    invoice._cached_reasoning = (raw, data)
+    return data
+
+
+def _result_key(invoice, vendor):
+    """Hash of everything the agents look at; config.updated_at drops entries after admin changes.
+    Today's date is included because the agents see the days until due, not the due date."""
+    config = get_finbot().get_config()
+    raw = (f"{invoice.amount}|{invoice.description}|{invoice.due_date}|{date.today()}|"
+           f"{vendor.id}|{vendor.company_name}|{vendor.trust_level}|{config.updated_at if config else ''}")
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _lookup_result(key):
+    """A copy of the cached chain for key, or None on a miss"""
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] >= RESULT_CACHE_TTL_S:
+            del _result_cache[key]
+            entry = None
+        if entry is not None:
+            _result_cache.move_to_end(key)
+    return copy.deepcopy(entry[0]) if entry is not None else None
+
+
+def _cached_result(key, multi_agent_finbot, invoice):
+    """Stores and returns a copy of the cached chain for key, or None on a miss"""
+    result = _lookup_result(key)
+    if result is None:
+        return None
+    logger.info("Result cache hit: Invoice #%s", invoice.id)
+    result['invoice_id'] = invoice.id
+    multi_agent_finbot.store_result(invoice, result)
+    return result
+
+
+def _store_cached_results(multi_agent_finbot, invoice_ids, result_keys):
+    """Stores the cached chain of every invoice whose key hits, loading those
+    invoices in one SELECT and writing them in one commit.
+    Returns ({invoice_id: result} for the hits, [(invoice_id, key)] for the misses)."""
+    hits = {}
+    misses = []
+    for invoice_id, key in zip(invoice_ids, result_keys):
+        result = _lookup_result(key)
+        if result is None:
+            misses.append((invoice_id, key))
+        else:
+            logger.info("Result cache hit: Invoice #%s", invoice_id)
+            result['invoice_id'] = invoice_id
+            hits[invoice_id] = result
+    if hits:
+        for invoice in Invoice.query.filter(Invoice.id.in_(list(hits))).all():
+            multi_agent_finbot.store_result(invoice, hits[invoice.id], commit=False)
+        db.session.commit()
+    return hits, misses
+
+
+def _cache_result(key, result):
+    with _result_cache_lock:
+        _result_cache[key] = (copy.deepcopy(result), time.monotonic())
+        _result_cache.move_to_end(key)
+        if len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+
+def _process_invoice_cached(multi_agent_finbot, invoice, vendor):
+    """process_invoice with an LRU cache in front; failed chains are cached too"""
+    key = _result_key(invoice, vendor)
+    result = _cached_result(key, multi_agent_finbot, invoice)
+    if result is None:
+        result = multi_agent_finbot.process_invoice(invoice.id)
+        _cache_result(key, result)
+    return result
+
+
+def _process_invoices_cached(multi_agent_finbot, invoice_ids, result_keys):
+    """Cache hits are served directly; the misses go through the agents as
+    batches, one LLM call per stage (process_invoices_batch falls back to
+    one-by-one processing for a batch that fails).
+    Takes ids and _result_key values rather than invoices, so the caller can
+    read them before a commit expires the instances."""
+    results, misses = _store_cached_results(multi_agent_finbot, invoice_ids, result_keys)
+    
+    if misses:
+        outcomes = multi_agent_finbot.process_invoices_batch([invoice_id for invoice_id, _ in misses])
+        for (invoice_id, key), outcome in zip(misses, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error("EXCEPTION IN PROCESSING: Invoice #%s", invoice_id, exc_info=outcome)
+                result = {"error": f"Processing failed: {str(outcome)}"}
+            else:
+                _cache_result(key, outcome)
+                result = outcome
+            results[invoice_id] = result
+    
+    return [{"invoice_id": invoice_id, "processing_result": results[invoice_id]} for invoice_id in invoice_ids]
+
+
+def _stream_invoices_cached(multi_agent_finbot, invoice_ids, result_keys):
+    """NDJSON counterpart of _process_invoices_cached: one line per invoice as
+    soon as its result is known, cache hits first, then the agent chains in
+    the order they finish"""
+    hits, misses = _store_cached_results(multi_agent_finbot, invoice_ids, result_keys)
+    for invoice_id, result in hits.items():
+        yield orjson.dumps({"invoice_id": invoice_id, "processing_result": result}) + b'\n'
+    
+    misses = dict(misses)
+    for invoice_id, outcome in multi_agent_finbot.iter_processed_invoices(list(misses)):
+        if isinstance(outcome, Exception):
+            logger.error("EXCEPTION IN PROCESSING: Invoice #%s", invoice_id, exc_info=outcome)
+            outcome = {"error": f"Processing failed: {str(outcome)}"}
+        else:
+            _cache_result(misses[invoice_id], outcome)
+        yield orjson.dumps({"invoice_id": invoice_id, "processing_result": outcome}) + b'\n'
 
 
 @vendor_bp.route('/vendors', methods=['POST'])
@@ -25,7 +199,7 @@ def register_vendor():
             contact_email=data['contact_email'],
             phone_number=data['phone_number'],
             business_type=data['business_type'],
-            vendor_category=json.dumps(data.get('vendor_category', [])),
+            vendor_category=data.get('vendor_category', []),
             tax_id=data['tax_id'],
             bank_name=data['bank_name'],
             account_holder_name=data['account_holder_name'],
@@ -38,6 +212,7 @@ def register_vendor():
         
         db.session.add(vendor)
         db.session.commit()
+        vendor_cache.invalidate_vendor()
         
         return jsonify({
             "success": True,
@@ -52,17 +227,28 @@ def register_vendor():
 @vendor_bp.route('/vendors/<int:vendor_id>', methods=['GET'])
 def get_vendor(vendor_id):
     """Get vendor details"""
-    vendor = Vendor.query.get(vendor_id)
-    if not vendor:
-        return jsonify({"error": "Vendor not found"}), 404
+    payload = vendor_cache.get_vendor_payload(vendor_id)
+    if payload is None:
+        version = vendor_cache.cache_version()
+        vendor = Vendor.query.get(vendor_id)
+        if not vendor:
+            return jsonify({"error": "Vendor not found"}), 404
+        payload = orjson.dumps(vendor.to_dict(), option=orjson.OPT_SORT_KEYS)
+        vendor_cache.put_vendor_payload(vendor_id, payload, version)
     
-    return jsonify(vendor.to_dict())
+    return Response(payload, mimetype='application/json')
 
 @vendor_bp.route('/vendors', methods=['GET'])
 def list_vendors():
     """List all vendors"""
-    vendors = Vendor.query.all()
-    return jsonify([vendor.to_dict() for vendor in vendors])
+    payload = vendor_cache.get_vendor_list_payload()
+    if payload is None:
+        version = vendor_cache.cache_version()
+        vendors = Vendor.query.all()
+        payload = orjson.dumps([vendor.to_dict() for vendor in vendors], option=orjson.OPT_SORT_KEYS)
+        vendor_cache.put_vendor_list_payload(payload, version)
+    
+    return Response(payload, mimetype='application/json')
 
 @vendor_bp.route('/vendors/<int:vendor_id>/invoices', methods=['POST'])
 def submit_invoice(vendor_id):
@@ -74,12 +260,12 @@ def submit_invoice(vendor_id):
         
         data = request.get_json()
         
-        existing_invoice = Invoice.query.filter_by(invoice_number=data['invoice_number']).first()
-        if existing_invoice:
-            return jsonify({"error": "Invoice number already exists"}), 400
+        errs = _precheck(data)
+        if errs:
+            return jsonify({"error": "Invalid invoice data", "details": errs}), 400
         
-        invoice_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d').date()
-        due_date = datetime.strptime(data['due_date'], '%Y-%m-%d').date()
+        invoice_date = _fast_date(data['invoice_date'])
+        due_date = _fast_date(data['due_date'])
         
         invoice = Invoice(
             vendor_id=vendor_id,
@@ -92,28 +278,41 @@ def submit_invoice(vendor_id):
         )
         
         db.session.add(invoice)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # invoice_number is UNIQUE - the insert itself is the duplicate check
+            db.session.rollback()
+            return jsonify({"error": "Invoice number already exists"}), 400
+        
+        # ?async=1: hand the pipeline to the background workers and return right away
+        if request.args.get('async') == '1':
+            queued = enqueue_invoice(current_app._get_current_object(), invoice.id)
+            return jsonify({
+                "success": True,
+                "invoice_id": invoice.id,
+                "status": "queued",
+                "queue_position": queued,
+                "result_url": f"/api/invoices/{invoice.id}/result"
+            }), 202
         
         # PROCESSING THROUGH MULTI-AGENT SYSTEM
-        print(f"\n{'='*60}")
-        print(f"MULTI-AGENT PROCESSING: Invoice #{invoice.id}")
-        print(f"{'='*60}")
+        logger.info("MULTI-AGENT PROCESSING: Invoice #%s", invoice.id)
         
         try:
-            # Create instance inside function (inside Flask context)
-            multi_agent_finbot = MultiAgentFinBot()
-            result = multi_agent_finbot.process_invoice(invoice.id)
+            # Shared instance; created on first use (inside Flask context)
+            multi_agent_finbot = get_finbot()
+            result = _process_invoice_cached(multi_agent_finbot, invoice, vendor)
             
-            print(f"\n{'='*60}")
-            print(f"PROCESSING COMPLETE")
-            print(f"Result keys: {list(result.keys())}")
-            print(f"Final Decision: {result.get('final_decision', 'UNKNOWN')}")
-            if 'cascade_analysis' in result:
-                print(f"Cascade Failures: {result['cascade_analysis'].get('cascade_failures_detected', 'UNKNOWN')}")
-                print(f"Confidence Degradation: {result['cascade_analysis'].get('confidence_degradation', 0):.3f}")
-            else:
-                print("⚠️  NO CASCADE ANALYSIS IN RESULT")
-            print(f"{'='*60}\n")
+            logger.info("PROCESSING COMPLETE: Invoice #%s, final decision: %s",
+                        invoice.id, result.get('final_decision', 'UNKNOWN'))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Result keys: %s", list(result.keys()))
+                if 'cascade_analysis' in result:
+                    logger.debug("Cascade Failures: %s", result['cascade_analysis'].get('cascade_failures_detected', 'UNKNOWN'))
+                    logger.debug("Confidence Degradation: %.3f", result['cascade_analysis'].get('confidence_degradation', 0))
+                else:
+                    logger.debug("NO CASCADE ANALYSIS IN RESULT")
             
             return jsonify({
                 "success": True,
@@ -122,16 +321,100 @@ def submit_invoice(vendor_id):
             }), 201
             
         except Exception as e:
-            print(f"\n❌ EXCEPTION IN PROCESSING: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("EXCEPTION IN PROCESSING: Invoice #%s", invoice.id)
             db.session.rollback()
             return jsonify({"error": f"Processing failed: {str(e)}"}), 500
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
-    
+
+@vendor_bp.route('/vendors/<int:vendor_id>/invoices/batch', methods=['POST'])
+def submit_invoices_batch(vendor_id):
+    """Submit several invoices in one request - one commit, one MultiAgentFinBot"""
+    try:
+        vendor = Vendor.query.get(vendor_id)
+        if not vendor:
+            return jsonify({"error": "Vendor not found"}), 404
+
+        items = request.get_json().get('invoices', [])
+        if not items:
+            return jsonify({"error": "No invoices provided"}), 400
+
+        for position, item in enumerate(items):
+            errs = _precheck(item)
+            if errs:
+                return jsonify({"error": f"Invalid invoice data at position {position}", "details": errs}), 400
+
+        numbers = [item['invoice_number'] for item in items]
+        if len(set(numbers)) != len(numbers):
+            return jsonify({"error": "Duplicate invoice numbers in batch"}), 400
+
+        rows = [
+            {
+                "vendor_id": vendor_id,
+                "invoice_number": item['invoice_number'],
+                "amount": float(item['amount']),
+                "description": item['description'],
+                "invoice_date": _fast_date(item['invoice_date']),
+                "due_date": _fast_date(item['due_date']),
+                "status": 'submitted'
+            }
+            for item in items
+        ]
+
+        # One multi-row INSERT ... RETURNING. sort_by_parameter_order would make
+        # SQLite fall back to one INSERT per row, so the rows are put back in
+        # payload order by their (unique) invoice numbers instead
+        try:
+            invoices = db.session.scalars(
+                insert(Invoice).returning(Invoice), rows
+            ).all()
+            position = {number: n for n, number in enumerate(numbers)}
+            invoices.sort(key=lambda invoice: position[invoice.invoice_number])
+            # Everything the processing below needs is read from the RETURNING
+            # rows now; the commit expires them and each read would reload a row
+            invoice_ids = [invoice.id for invoice in invoices]
+            queued = request.args.get('async') == '1'
+            result_keys = None if queued else [_result_key(invoice, vendor) for invoice in invoices]
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "Invoice number already exists"}), 400
+
+        if queued:
+            app = current_app._get_current_object()
+            for invoice_id in invoice_ids:
+                enqueue_invoice(app, invoice_id)
+            return jsonify({
+                "success": True,
+                "status": "queued",
+                "invoice_ids": invoice_ids,
+                "result_urls": [f"/api/invoices/{invoice_id}/result" for invoice_id in invoice_ids]
+            }), 202
+
+        logger.info("MULTI-AGENT BATCH PROCESSING: %d invoices", len(invoice_ids))
+
+        if request.args.get('stream') == '1':
+            # Each result is sent as soon as its chain finishes instead of with the slowest one
+            return Response(
+                stream_with_context(_stream_invoices_cached(get_finbot(), invoice_ids, result_keys)),
+                status=201, mimetype='application/x-ndjson'
+            )
+
+        results = _process_invoices_cached(get_finbot(), invoice_ids, result_keys)
+
+        logger.info("BATCH COMPLETE: %d invoices processed", len(results))
+
+        return jsonify({
+            "success": True,
+            "results": results
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @vendor_bp.route('/vendors/<int:vendor_id>/invoices/test_validator', methods=['POST'])
 def submit_invoice_validator(vendor_id):
     """Submit an invoice for processing - NOW USES MULTI-AGENT SYSTEM"""
@@ -142,12 +425,12 @@ def submit_invoice_validator(vendor_id):
         
         data = request.get_json()
         
-        existing_invoice = Invoice.query.filter_by(invoice_number=data['invoice_number']).first()
-        if existing_invoice:
-            return jsonify({"error": "Invoice number already exists"}), 400
+        errs = _precheck(data)
+        if errs:
+            return jsonify({"error": "Invalid invoice data", "details": errs}), 400
         
-        invoice_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d').date()
-        due_date = datetime.strptime(data['due_date'], '%Y-%m-%d').date()
+        invoice_date = _fast_date(data['invoice_date'])
+        due_date = _fast_date(data['due_date'])
         
         invoice = Invoice(
             vendor_id=vendor_id,
@@ -160,23 +443,25 @@ def submit_invoice_validator(vendor_id):
         )
         
         db.session.add(invoice)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # invoice_number is UNIQUE - the insert itself is the duplicate check
+            db.session.rollback()
+            return jsonify({"error": "Invoice number already exists"}), 400
         
         # PROCESSING THROUGH MULTI-AGENT SYSTEM
-        print(f"\n{'='*60}")
-        print(f"MULTI-AGENT PROCESSING: Invoice #{invoice.id}")
-        print(f"{'='*60}")
+        logger.info("MULTI-AGENT PROCESSING: Invoice #%s", invoice.id)
         
         try:
-            # Create instance inside function (inside Flask context)
-            multi_agent_finbot = MultiAgentFinBot()
+            # Shared instance; created on first use (inside Flask context)
+            multi_agent_finbot = get_finbot()
             result = multi_agent_finbot.test_validator_invoice(invoice.id)
             
-            print(f"\n{'='*60}")
-            print(f"PROCESSING COMPLETE")
-            for key, value in result.items():
-                print(f"{key}: {value}")
-            print(f"{'='*60}\n")
+            logger.info("PROCESSING COMPLETE: Invoice #%s", invoice.id)
+            if logger.isEnabledFor(logging.DEBUG):
+                for key, value in result.items():
+                    logger.debug("%s: %s", key, value)
             
             return jsonify({
                 "message": "Invoice processed",
@@ -185,21 +470,17 @@ def submit_invoice_validator(vendor_id):
             }), 201
         
         except Exception as e:
-            print(f"\n❌ EXCEPTION IN PROCESSING: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("EXCEPTION IN PROCESSING: Invoice #%s", invoice.id)
             db.session.rollback()
             return jsonify({"error": f"Processing failed: {str(e)}"}), 500
         
     except openai.APIError as e:
-        print(f"OpenAI API Error: {e}")
+        logger.error("OpenAI API Error: %s", e)
         db.session.rollback()
         return jsonify({"error": f"AI service unavailable: {str(e)}"}), 503
     
     except Exception as e:
-        print(f"Server error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Server error: %s", e)
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
@@ -216,17 +497,18 @@ def get_vendor_invoices(vendor_id):
 @vendor_bp.route('/invoices/<int:invoice_id>', methods=['GET'])
 def get_invoice(invoice_id):
     """Get invoice details with cascade analysis"""
-    invoice = Invoice.query.get(invoice_id)
+    # Vendor comes with the invoice in the same SELECT
+    invoice = db.session.get(Invoice, invoice_id, options=[joinedload(Invoice.vendor)])
     if not invoice:
         return jsonify({"error": "Invoice not found"}), 404
     
     invoice_data = invoice.to_dict()
-    vendor_data = Vendor.query.get(invoice.vendor_id).to_dict()
+    vendor_data = invoice.vendor.to_dict()
     
     # Parse cascade analysis if present
     if invoice.ai_reasoning:
         try:
-            reasoning_data = json.loads(invoice.ai_reasoning)
+            reasoning_data = _reasoning_of(invoice)
             invoice_data['cascade_analysis'] = reasoning_data.get('cascade_analysis')
             invoice_data['agent_chain'] = reasoning_data.get('agent_chain')
         except:
@@ -237,40 +519,73 @@ def get_invoice(invoice_id):
         "vendor": vendor_data
     })
 
+@vendor_bp.route('/invoices/<int:invoice_id>/result', methods=['GET'])
+def get_invoice_result(invoice_id):
+    """Get the processing result of a (queued) invoice"""
+    invoice = Invoice.query.get(invoice_id)
+    if not invoice:
+        return jsonify({"error": "Invoice not found"}), 404
+    
+    if invoice.status in ('submitted', 'processing'):
+        return jsonify({"invoice_id": invoice_id, "status": invoice.status}), 202
+    
+    if invoice.status == 'failed':
+        return jsonify({"invoice_id": invoice_id, "status": invoice.status, "error": "Processing failed"}), 500
+    
+    reasoning_data = _reasoning_of(invoice)
+    
+    return jsonify({
+        "invoice_id": invoice_id,
+        "status": invoice.status,
+        "ai_decision": invoice.ai_decision,
+        "ai_confidence": invoice.ai_confidence,
+        "payment_processed": invoice.payment_processed,
+        "agent_chain": reasoning_data.get('agent_chain', []),
+        "cascade_analysis": reasoning_data.get('cascade_analysis', {})
+    })
+
 @vendor_bp.route('/invoices', methods=['GET'])
 def list_invoices():
     """List all invoices with optional filtering"""
     status = request.args.get('status')
     vendor_id = request.args.get('vendor_id')
     
-    query = Invoice.query
+    # Vendor name is joined in, instead of one Vendor lookup per invoice
+    query = db.session.query(Invoice, Vendor.company_name).outerjoin(Vendor, Vendor.id == Invoice.vendor_id)
     
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Invoice.status == status)
     if vendor_id:
-        query = query.filter_by(vendor_id=vendor_id)
+        query = query.filter(Invoice.vendor_id == vendor_id)
     
-    invoices = query.order_by(Invoice.created_at.desc()).all()
+    query = query.order_by(Invoice.created_at.desc())
     
-    result = []
-    for invoice in invoices:
-        invoice_data = invoice.to_dict()
-        vendor = Vendor.query.get(invoice.vendor_id)
-        invoice_data['vendor_name'] = vendor.company_name if vendor else 'Unknown'
-        
-        # Add cascade error information
-        if invoice.ai_reasoning:
-            try:
-                reasoning_data = json.loads(invoice.ai_reasoning)
-                cascade_info = reasoning_data.get('cascade_analysis', {})
-                invoice_data['cascade_failures'] = cascade_info.get('cascade_failures_detected', False)
-                invoice_data['failed_agents'] = cascade_info.get('failed_agents', 0)
-            except:
-                pass
-        
-        result.append(invoice_data)
+    return Response(stream_with_context(_stream_invoices(query)), mimetype='application/json')
+
+def _invoice_row(invoice, vendor_name):
+    invoice_data = invoice.to_dict()
+    invoice_data['vendor_name'] = vendor_name or 'Unknown'
     
-    return jsonify(result)
+    # Add cascade error information
+    if invoice.ai_reasoning:
+        try:
+            reasoning_data = _reasoning_of(invoice)
+            cascade_info = reasoning_data.get('cascade_analysis', {})
+            invoice_data['cascade_failures'] = cascade_info.get('cascade_failures_detected', False)
+            invoice_data['failed_agents'] = cascade_info.get('failed_agents', 0)
+        except:
+            pass
+    
+    return invoice_data
+
+def _stream_invoices(query):
+    """Emits the invoice list as a JSON array one row at a time, fetching rows in chunks of 200"""
+    yield b'['
+    separator = b''
+    for invoice, vendor_name in query.yield_per(200):
+        yield separator + orjson.dumps(_invoice_row(invoice, vendor_name))
+        separator = b','
+    yield b']'
 
 @vendor_bp.route('/invoices/<int:invoice_id>/cascade-analysis', methods=['GET'])
 def get_cascade_analysis(invoice_id):
@@ -283,7 +598,7 @@ def get_cascade_analysis(invoice_id):
         return jsonify({"error": "No cascade analysis available"}), 404
     
     try:
-        reasoning_data = json.loads(invoice.ai_reasoning)
+        reasoning_data = _reasoning_of(invoice)
         
         return jsonify({
             "invoice_id": invoice_id,
@@ -0,0 +1,52 @@
+import logging
+import os
+import queue
+import threading
+from src.models.vendor import Invoice, db
+from src.services.multi_agent_finbot import get_finbot
+
+# Number of background threads running the agent pipeline
+WORKER_COUNT = int(os.getenv('FINBOT_WORKERS', '2'))
+
+logger = logging.getLogger(__name__)
+
+_jobs = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _worker(app):
+    """Pulls invoice ids off the queue and runs them through the agent chain"""
+    while True:
+        invoice_id = _jobs.get()
+        try:
+            with app.app_context():
+                try:
+                    # process_invoice stores the result in Invoice.ai_reasoning
+                    get_finbot().process_invoice(invoice_id)
+                except Exception:
+                    logger.exception("EXCEPTION IN QUEUED PROCESSING: Invoice #%s", invoice_id)
+                    db.session.rollback()
+                    invoice = Invoice.query.get(invoice_id)
+                    if invoice:
+                        invoice.status = 'failed'
+                        db.session.commit()
+        finally:
+            _jobs.task_done()
+
+
+def _start_workers(app):
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(WORKER_COUNT):
+            thread = threading.Thread(target=_worker, args=(app,), name=f"finbot-worker-{i}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+
+
+def enqueue_invoice(app, invoice_id):
+    """Queues an invoice for background processing, starting the workers on first use"""
+    _start_workers(app)
+    _jobs.put(invoice_id)
+    return _jobs.qsize()
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+# Serialized vendor JSON for the read endpoints, dropped on every vendor write
+CACHE_SIZE = 1024
+
+_payloads = OrderedDict()  # vendor_id -> bytes
+_list_payload = None  # bytes of the full list_vendors array
+_version = 0  # bumped on every invalidation
+_lock = threading.Lock()
+
+
+def cache_version():
+    """Read before querying; pass to the put_* call so a payload built from data
+    that changed in the meantime is not stored"""
+    return _version
+
+
+def get_vendor_payload(vendor_id):
+    with _lock:
+        payload = _payloads.get(vendor_id)
+        if payload is not None:
+            _payloads.move_to_end(vendor_id)
+        return payload
+
+
+def put_vendor_payload(vendor_id, payload, version):
+    with _lock:
+        if version != _version:
+            return
+        _payloads[vendor_id] = payload
+        _payloads.move_to_end(vendor_id)
+        if len(_payloads) > CACHE_SIZE:
+            _payloads.popitem(last=False)
+
+
+def get_vendor_list_payload():
+    return _list_payload
+
+
+def put_vendor_list_payload(payload, version):
+    global _list_payload
+    with _lock:
+        if version == _version:
+            _list_payload = payload
+
+
+def invalidate_vendor(vendor_id=None):
+    """Call after any vendor write; vendor_id=None only drops the list"""
+    global _list_payload, _version
+    with _lock:
+        _version += 1
+        _list_payload = None
+        if vendor_id is not None:
+            _payloads.pop(vendor_id, None)